@@ -0,0 +1,171 @@
+import json
+import argparse
+
+from solana.publickey import PublicKey
+from solana.keypair import Keypair
+
+from bulk_read import fetch_accounts, grouped
+from instruction_builder import get_metadata_account, create_metadata_instruction, update_metadata_instruction
+from metadata import get_create_metadata_instruction, get_update_metadata_instruction, parse_metadata_account
+from pipeline import Journal, Sender, pack_instructions, pending_entries, run_pipeline
+
+TESTNET = "https://api.testnet.solana.com"
+MAINNET = "https://ssc-dao.genesysgo.net/"
+DEVNET = "https://api.devnet.solana.com"
+
+USENET = TESTNET
+
+# rows are pre-read from the cluster this many at a time while streaming the mints file
+READ_AHEAD = 1000
+
+
+def get_keypair(keypath):
+    with open(keypath) as f:
+        kpb = json.loads(f.read())
+    return Keypair.from_secret_key(secret_key=bytes(kpb))
+
+
+def read_mint_fields(mints_file):
+    with open(mints_file) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def creators_layout(creators, current_creators=None):
+    # when updating, a creator without an explicit verified flag keeps the one it has on chain,
+    # since the program refuses to unverify any creator but the signer
+    verified = {bytes(c.address.pub_key): c.verified for c in current_creators or []}
+    return [
+        {
+            "address": {"pub_key": bytes(PublicKey(c["address"]))},
+            "verified": c["verified"] if "verified" in c else verified.get(bytes(PublicKey(c["address"])), False),
+            "share": c["share"],
+        }
+        for c in creators
+    ]
+
+
+def collection_layout(collection):
+    return {"verified": False, "key": {"pub_key": bytes(PublicKey(collection))}}
+
+
+def _same_collection(row, current):
+    return current.collection is not None and bytes(current.collection.key.pub_key) == bytes(PublicKey(row["collection"]))
+
+
+def _creators_key(creators):
+    return [(bytes(c["address"]["pub_key"]), c["verified"], c["share"]) for c in creators or []]
+
+
+def _is_noop_update(row, current):
+    for field in ("name", "symbol", "uri", "seller_fee_basis_points"):
+        if field in row and row[field] != current.data[field]:
+            return False
+    if "creators" in row and (_creators_key(creators_layout(row["creators"], current.data.creators)) !=
+                              _creators_key(current.data.creators)):
+        return False
+    if "collection" in row and not _same_collection(row, current):
+        return False
+    if "is_mutable" in row and row["is_mutable"] != current.is_mutable:
+        return False
+    if "primary_sale_happened" in row and row["primary_sale_happened"] != current.primary_sale_happened:
+        return False
+    if "update_authority" in row and bytes(PublicKey(row["update_authority"])) != bytes(current.update_authority.pub_key):
+        return False
+    return True
+
+
+def get_update_entry(row, current, authority):
+    # UpdateMetadataAccountV2 replaces the whole data struct, so anything the row leaves out is carried over
+    data = get_update_metadata_instruction(
+        row.get("name", current.data.name),
+        row.get("symbol", current.data.symbol),
+        row.get("uri", current.data.uri),
+        row.get("seller_fee_basis_points", current.data.seller_fee_basis_points),
+        bytes(PublicKey(row["update_authority"])) if "update_authority" in row else None,
+        primary_sale_happened=row.get("primary_sale_happened"),
+        creators=creators_layout(row["creators"], current.data.creators) if "creators" in row
+        else current.data.creators,
+        # the current collection is passed through as is when the row names it, so a verified item stays verified
+        collection=collection_layout(row["collection"]) if "collection" in row and not _same_collection(row, current)
+        else current.collection,
+        is_mutable=row.get("is_mutable"),
+        uses=current.uses,
+    )
+    return [update_metadata_instruction(data, authority.public_key, PublicKey(row["mint"]))]
+
+
+def get_create_entry(row, authority):
+    data = get_create_metadata_instruction(
+        row["name"],
+        row["symbol"],
+        row["uri"],
+        row["seller_fee_basis_points"],
+        is_mutable=row.get("is_mutable", True),
+        creators=creators_layout(row["creators"]) if "creators" in row else None,
+        collection=collection_layout(row["collection"]) if "collection" in row else None,
+    )
+    return [create_metadata_instruction(data, update_authority=authority.public_key, mint_key=PublicKey(row["mint"]),
+                                        mint_authority_key=authority.public_key, payer=authority.public_key)]
+
+
+def get_metadata_entries(api_endpoint, rows, mode, authority, workers=8):
+    for group in grouped(rows, READ_AHEAD):
+        metadata_accounts = fetch_accounts(api_endpoint, [get_metadata_account(row["mint"]) for row in group], workers)
+        for row, account_data in zip(group, metadata_accounts):
+            if mode == "create":
+                if account_data is not None:
+                    print(f"SKIPPED {row['mint']}: metadata already exists")
+                    continue
+                yield row["mint"], get_create_entry(row, authority), [authority]
+            else:
+                if account_data is None:
+                    print(f"SKIPPED {row['mint']}: no metadata account")
+                    continue
+                current = parse_metadata_account(account_data)
+                if _is_noop_update(row, current):
+                    continue
+                yield row["mint"], get_update_entry(row, current, authority), [authority]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='bulk create or update token metadata')
+    parser.add_argument('--usenet', action="store", choices=["devnet", "testnet", "mainnet"],
+                        help='cluster to send transactions to')
+    parser.add_argument('--customnet', action="store",
+                        help='custom rpc endpoint to hit')
+    parser.add_argument('--mode', action="store", choices=["update", "create"], default="update",
+                        help='update existing metadata accounts or create missing ones')
+    parser.add_argument('--workers', action="store", type=int, default=8,
+                        help='number of transactions in flight at once')
+    parser.add_argument('--journal', action="store",
+                        help='file recording mints that already landed. defaults to <mints_file>.<mode>.journal')
+
+    parser.add_argument('payment_key', action="store", help='path to the keypair used for payments. must be the update '
+                                                            'authority (and mint authority when creating)')
+    parser.add_argument('mints_file', action="store", help='json lines file, one object per mint. "mint" is required, '
+                                                           'name, symbol, uri, seller_fee_basis_points, creators, '
+                                                           'collection, is_mutable, primary_sale_happened and '
+                                                           'update_authority are optional when updating')
+
+    args = parser.parse_args()
+    use_network = USENET
+
+    if args.usenet == "testnet":
+        use_network = TESTNET
+    elif args.usenet == "mainnet":
+        use_network = MAINNET
+
+    if args.customnet:
+        use_network = args.customnet
+
+    source_account = get_keypair(args.payment_key)
+    journal = Journal(args.journal or f"{args.mints_file}.{args.mode}.journal")
+
+    rows = pending_entries(read_mint_fields(args.mints_file), journal, key=lambda row: row["mint"])
+    entries = get_metadata_entries(use_network, rows, args.mode, source_account, args.workers)
+    batches = pack_instructions(entries, source_account.public_key)
+    sent, failed = run_pipeline(Sender(use_network), batches, journal, args.workers)
+    journal.close()
+    print(f"{sent} transactions landed, {failed} failed. {len(journal.done)} mints done in total")
@@ -0,0 +1,43 @@
+import base64
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# getMultipleAccounts rejects requests for more than 100 accounts
+MAX_ACCOUNTS_PER_REQUEST = 100
+
+
+def chunks(seq, size):
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+
+def grouped(rows, size):
+    # like chunks, but for streams that can't be sliced
+    rows = iter(rows)
+    while True:
+        group = list(itertools.islice(rows, size))
+        if not group:
+            return
+        yield group
+
+
+def fetch_accounts(api_endpoint, pubkeys, workers=8, chunk_size=MAX_ACCOUNTS_PER_REQUEST, commitment=None):
+    # returns the raw account data for each pubkey in input order, None where the account does not exist
+    from solana.rpc.api import Client
+
+    local = threading.local()
+
+    def fetch(chunk):
+        if not hasattr(local, "client"):
+            local.client = Client(api_endpoint)
+        resp = local.client.get_multiple_accounts(chunk, commitment=commitment, encoding="base64")
+        if "error" in resp:
+            raise RuntimeError(f"getMultipleAccounts failed: {resp['error']}")
+        return [base64.b64decode(account["data"][0]) if account is not None else None
+                for account in resp["result"]["value"]]
+
+    pubkeys = list(pubkeys)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(fetch, chunks(pubkeys, chunk_size))
+        return [data for chunk in results for data in chunk]
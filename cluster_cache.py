@@ -0,0 +1,54 @@
+import os
+import json
+import time
+
+# sizes from spl-token's MINT_LAYOUT and ACCOUNT_LAYOUT. associated token accounts are plain token accounts
+MINT_SIZE = 82
+TOKEN_ACCOUNT_SIZE = 165
+# MAX_METADATA_LEN and MAX_EDITION_LEN from spl-token-metadata
+METADATA_SIZE = 679
+EDITION_SIZE = 241
+
+DEFAULT_TTL = 24 * 60 * 60
+CACHE_PATH = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+                          "airdroppy", "cluster_constants.json")
+
+
+def _load_cache(path):
+    try:
+        with open(path) as f:
+            return json.loads(f.read())
+    except (OSError, ValueError):
+        return {}
+
+
+def _store_cache(path, cache):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(json.dumps(cache, indent=2))
+    os.replace(tmp_path, path)
+
+
+def get_rent_exempt_minimum(api_endpoint, size, ttl=DEFAULT_TTL, refresh=False, path=CACHE_PATH):
+    # cached per endpoint and account size, only hitting the rpc when the entry is missing or older than ttl seconds
+    cache = _load_cache(path)
+    entry = cache.get(api_endpoint, {}).get(str(size))
+    if entry and not refresh and time.time() - entry["fetched_at"] < ttl:
+        return entry["lamports"]
+
+    from solana.rpc.api import Client
+
+    lamports = Client(api_endpoint).get_minimum_balance_for_rent_exemption(size)["result"]
+    cache.setdefault(api_endpoint, {})[str(size)] = {"lamports": lamports, "fetched_at": time.time()}
+    try:
+        _store_cache(path, cache)
+    except OSError:
+        pass
+    return lamports
+
+
+def get_rent_exempt_minimums(api_endpoint, ttl=DEFAULT_TTL, refresh=False, path=CACHE_PATH):
+    # returns (min_balance_mint, min_balance_token_account)
+    return (get_rent_exempt_minimum(api_endpoint, MINT_SIZE, ttl, refresh, path),
+            get_rent_exempt_minimum(api_endpoint, TOKEN_ACCOUNT_SIZE, ttl, refresh, path))
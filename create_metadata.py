@@ -4,17 +4,10 @@ import argparse
 
 from solana.publickey import PublicKey
 from solana.keypair import Keypair
-from solana.rpc.api import Client
-from solana.rpc.types import TxOpts
 from solana.transaction import Transaction
 
-
-from spl.token.core import _TokenCore
-from spl.token.client import Token
-from spl.token.instructions import get_associated_token_address, transfer, TransferParams
-
-from instruction_builder import mint_new_edition_from_master_edition_instruction, create_metadata_instruction, update_metadata_instruction
-from metadata import get_create_metadata_instruction, get_update_metadata_instruction
+from instruction_builder import create_metadata_instruction
+from metadata import get_create_metadata_instruction
 
 TESTNET = "https://api.testnet.solana.com"
 MAINNET = "https://ssc-dao.genesysgo.net/"
@@ -50,6 +43,9 @@ def await_confirmation(client, signatures, max_timeout=60, target=20, finalized=
 
 def execute(api_endpoint, tx, signers, skip_confirmation=True, max_timeout=60, target=20,
             finalized=True):
+    from solana.rpc.api import Client
+    from solana.rpc.types import TxOpts
+
     client = Client(api_endpoint)
     try:
         result = client.send_transaction(tx, *signers, opts=TxOpts(skip_preflight=True))
@@ -63,6 +59,9 @@ def execute(api_endpoint, tx, signers, skip_confirmation=True, max_timeout=60, t
         print(traceback.format_exc())
 
 def get_instruction_batch_xfer(conn, mint_key, dest, source_ta, payer):
+    from spl.token.client import Token
+    from spl.token.instructions import transfer, TransferParams
+
     token = Token(conn, mint_key, PublicKey("TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA"),payer)
     assoc_addr, txn, _,_ = token._create_associated_token_account_args(dest, False)
     params = TransferParams(
@@ -98,6 +97,8 @@ if __name__ == "__main__":
     if args.customnet:
         use_network = args.customnet
 
+    from solana.rpc.api import Client
+
     http_client = Client(use_network)
 
     source_account = get_keypair(args.payment_key)
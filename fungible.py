@@ -4,17 +4,9 @@ import argparse
 
 from solana.publickey import PublicKey
 from solana.keypair import Keypair
-from solana.rpc.api import Client
-from solana.rpc.types import TxOpts
-from solana.transaction import Transaction
 
-
-from spl.token.core import _TokenCore
-from spl.token.client import Token
-from spl.token.instructions import get_associated_token_address, transfer, TransferParams
-
-from instruction_builder import mint_new_edition_from_master_edition_instruction, create_metadata_instruction, update_metadata_instruction
-from metadata import get_create_metadata_instruction, get_update_metadata_instruction
+from instruction_builder import SYSTEM_PROGRAM_ID, SYSVAR_RENT_PUBKEY, ASSOCIATED_TOKEN_ACCOUNT_PROGRAM_ID
+from cluster_cache import get_rent_exempt_minimums
 
 TESTNET = "https://api.testnet.solana.com"
 MAINNET = "https://ssc-dao.genesysgo.net/"
@@ -23,10 +15,12 @@ DEVNET = "https://api.devnet.solana.com"
 USENET = TESTNET
 
 def get_address_list(address_file):
+    from recipients import RecipientTable
+
+    # one row per line, each for a single token
     with open(address_file) as f:
-        lines = filter(lambda x: len(x) > 1, f.read().split("\n"))
-    addresses = [PublicKey(l) for l in lines]
-    return addresses
+        lines = filter(lambda x: len(x) > 1, (l.rstrip("\n") for l in f))
+        return RecipientTable.from_rows(((l, 0, 1) for l in lines), with_amounts=True)
 
 def get_keypair(keypath):
     with open(keypath) as f:
@@ -56,6 +50,9 @@ def await_confirmation(client, signatures, max_timeout=60, target=20, finalized=
 
 def execute(api_endpoint, tx, signers, skip_confirmation=True, max_timeout=60, target=20,
             finalized=True):
+    from solana.rpc.api import Client
+    from solana.rpc.types import TxOpts
+
     client = Client(api_endpoint)
     try:
         result = client.send_transaction(tx, *signers, opts=TxOpts(skip_preflight=True))
@@ -69,6 +66,9 @@ def execute(api_endpoint, tx, signers, skip_confirmation=True, max_timeout=60, t
         print(traceback.format_exc())
 
 def get_instruction_batch_xfer(conn, mint_key, dest, source_ta, payer):
+    from spl.token.client import Token
+    from spl.token.instructions import transfer, TransferParams
+
     token = Token(conn, mint_key, PublicKey("TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA"),payer)
     assoc_addr, txn, _,_ = token._create_associated_token_account_args(dest, False)
     params = TransferParams(
@@ -92,6 +92,24 @@ if __name__ == "__main__":
     parser.add_argument('payment_key', action="store", help='path to the keypair used for payments')
     parser.add_argument('mint_key', action="store", help='master edition must already be created and owned by payment_key')
     parser.add_argument('airdrop_file', action="store", help='file containing addresses')
+    parser.add_argument('--lookup-table', action="store_true",
+                        help='send v0 transactions through an address lookup table created once per drop, '
+                             'packing as many transfers per transaction as fit')
+    parser.add_argument('--shards', action="store", type=int, default=1,
+                        help='split the tokens across this many source token accounts. the fee payer is write '
+                             'locked too, so transfers only stop contending for write locks with as many distinct '
+                             '--shard-payers as shards')
+    parser.add_argument('--shard-payers', action="store",
+                        help='comma separated keypair paths owning the shards and paying their fees, '
+                             'round robin. defaults to payment_key')
+    parser.add_argument('--workers', action="store", type=int, default=8,
+                        help='number of transactions in flight at once with --lookup-table or --shards')
+    parser.add_argument('--plan', action="store_true",
+                        help='build every transaction without sending and report count, sizes, cost and duration')
+    parser.add_argument('--plan-rate', action="store", type=float, default=4,
+                        help='send rate in transactions per second used to project the duration of --plan')
+    parser.add_argument('--plan-sample', action="store", type=int, default=20,
+                        help='number of planned transactions to simulate, 0 to skip simulation')
 
     args = parser.parse_args()
     use_network = USENET
@@ -104,6 +122,9 @@ if __name__ == "__main__":
     if args.customnet:
         use_network = args.customnet
 
+    from solana.rpc.api import Client
+    from spl.token.instructions import get_associated_token_address
+
     http_client = Client(use_network)
 
     source_account = get_keypair(args.payment_key)
@@ -113,10 +134,81 @@ if __name__ == "__main__":
     addresses = get_address_list(airdrop_file)
     source_ta = get_associated_token_address(source_account.public_key, mint_key)
 
-    for dest_address in addresses:
-        txn = get_instruction_batch_xfer(http_client, mint_key, dest_address, source_ta, source_account)
-        signers = [source_account]
-        print(execute(use_network, txn, signers, True))
-
-
-
+    from sharding import Shard, assign_shards, get_transfer_entries, pack_sharded, setup_shards, shard_totals
+
+    lookup_state_path = f"{airdrop_file}.lookup_table"
+    lookup_addresses = [source_ta, mint_key, SYSTEM_PROGRAM_ID, SYSVAR_RENT_PUBKEY]
+    # every address gets a single token, sent once
+    recipients = addresses.merge_duplicates()
+    recipients.amounts[:] = 1
+    sharded = args.shards > 1 or args.shard_payers
+
+    def build_xfer(dest, amount, shard):
+        return get_instruction_batch_xfer(http_client, mint_key, dest, shard.token_account, shard.owner)
+
+    if args.plan:
+        from planner import plan_drop, planned_lookup_table, print_plan, simulate_sample
+        from pipeline import Sender
+
+        sender = Sender(use_network)
+        can_simulate = True
+        if args.lookup_table:
+            table, can_simulate = planned_lookup_table(sender, lookup_addresses, lookup_state_path)
+            sender.lookup_tables = [table]
+        _, min_balance_token_account = get_rent_exempt_minimums(use_network)
+
+        def rent_of(keys, instructions):
+            # only recipients without an associated token account get one created. the default run tries on every
+            # line and a create that fails pays no rent, so there this is an upper bound
+            return min_balance_token_account * sum(1 for ix in instructions
+                                                   if ix.program_id == ASSOCIATED_TOKEN_ACCOUNT_PROGRAM_ID)
+
+        if args.lookup_table or sharded:
+            # shards only spread write locks, sizes and costs are the same as sending from the payer
+            shards = [Shard(source_account, source_ta)]
+            entries = get_transfer_entries(use_network, mint_key, assign_shards(recipients, 1), shards, build_xfer)
+            batches = pack_sharded(entries, lookup_tables=sender.lookup_tables)
+        else:
+            # the default run sends a create associated token account + transfer transaction for every line,
+            # duplicates and existing token accounts included
+            batches = (([str(dest)], get_instruction_batch_xfer(http_client, mint_key, dest, source_ta,
+                                                                source_account).instructions, [source_account])
+                       for dest, _ in addresses)
+        plan = plan_drop(batches, rent_of, args.plan_sample, sender.lookup_tables)
+        failures = None
+        if args.plan_sample and can_simulate:
+            failures = simulate_sample(sender, plan.sample, args.workers)
+        elif args.plan_sample:
+            print("lookup table not created yet, skipping simulation")
+        lamports_per_signature = http_client.get_recent_blockhash()["result"]["value"]["feeCalculator"]["lamportsPerSignature"]
+        print_plan(plan, lamports_per_signature, args.plan_rate, failures)
+    elif args.lookup_table or sharded:
+        from lookup_table import ensure_lookup_table
+        from pipeline import Journal, Sender, pending_entries, run_pipeline
+
+        sender = Sender(use_network)
+        shards = [Shard(source_account, source_ta)]
+        if sharded:
+            owners = [get_keypair(p) for p in args.shard_payers.split(",")] if args.shard_payers else [source_account]
+            totals, counts = shard_totals(recipients, args.shards)
+            _, min_balance_token_account = get_rent_exempt_minimums(use_network)
+            shards = setup_shards(sender, source_account, mint_key, source_ta, owners, totals, counts, airdrop_file,
+                                  f"{airdrop_file}.shards.json", min_balance_token_account,
+                                  min_balance_token_account + 5000)
+            lookup_addresses += [s.token_account for s in shards]
+        if args.lookup_table:
+            sender.lookup_tables = [ensure_lookup_table(sender, source_account, lookup_addresses, lookup_state_path)]
+        journal = Journal(f"{airdrop_file}.journal")
+
+        # shards are assigned over the whole file before skipping what already landed, so a rerun keeps them
+        pending = pending_entries(assign_shards(recipients, len(shards)), journal, key=lambda a: str(a[1][0]))
+        entries = get_transfer_entries(use_network, mint_key, pending, shards, build_xfer, args.workers)
+        batches = pack_sharded(entries, lookup_tables=sender.lookup_tables)
+        sent, failed = run_pipeline(sender, batches, journal, args.workers)
+        journal.close()
+        print(f"{sent} transactions landed, {failed} failed. {len(journal.done)} addresses done in total")
+    else:
+        for dest_address, _ in addresses:
+            txn = get_instruction_batch_xfer(http_client, mint_key, dest_address, source_ta, source_account)
+            signers = [source_account]
+            print(execute(use_network, txn, signers, True))
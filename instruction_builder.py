@@ -3,8 +3,6 @@ import math
 from solana.publickey import PublicKey
 from solana.transaction import AccountMeta, TransactionInstruction
 
-from metadata import get_mint_new_edition_from_master_edition_instruction
-
 
 METADATA_PROGRAM_ID = PublicKey('metaqbxxUerdq28cj1RbAWkYQm3ybzjb6a8bt518x1s')
 SYSTEM_PROGRAM_ID = PublicKey('11111111111111111111111111111111')
@@ -99,6 +97,9 @@ def mint_new_edition_from_master_edition_instruction(edition_number, master_mint
                                                      master_token_account_owner,
                                                      master_token_account,
                                                      payer):
+    # metadata pulls in borsh_construct, only import it when a builder needs it
+    from metadata import get_mint_new_edition_from_master_edition_instruction
+
     new_edition_account = get_edition(new_mint)
     new_metadata_account = get_metadata_account(new_mint)
 
@@ -132,3 +133,97 @@ def mint_new_edition_from_master_edition_instruction(edition_number, master_mint
         program_id=METADATA_PROGRAM_ID,
         data=data,
     )
+
+
+def get_collection_authority_record(mint_key, collection_authority):
+    return PublicKey.find_program_address(
+        [b'metadata', bytes(METADATA_PROGRAM_ID), bytes(PublicKey(mint_key)), b"collection_authority",
+         bytes(PublicKey(collection_authority))],
+        METADATA_PROGRAM_ID
+    )[0]
+
+
+    # ///   0. `[writable]` Metadata account
+    # ///   1. `[signer]` Collection Update authority
+    # ///   2. `[signer]` payer
+    # ///   3. `[]` Mint of the Collection
+    # ///   4. `[]` Metadata Account of the Collection
+    # ///   5. `[]` MasterEdition2 Account of the Collection Token
+    # ///   6. Optional `[]` Collection Authority Record PDA, when the authority is a delegate
+
+def verify_collection_instruction(mint, collection_authority, payer, collection_mint, delegated=False):
+    from metadata import get_verify_collection_instruction
+
+    keys = [
+        AccountMeta(pubkey=get_metadata_account(mint), is_signer=False, is_writable=True),
+        AccountMeta(pubkey=collection_authority, is_signer=True, is_writable=True),
+        AccountMeta(pubkey=payer, is_signer=True, is_writable=True),
+        AccountMeta(pubkey=collection_mint, is_signer=False, is_writable=False),
+        AccountMeta(pubkey=get_metadata_account(collection_mint), is_signer=False, is_writable=False),
+        AccountMeta(pubkey=get_edition(collection_mint), is_signer=False, is_writable=False),
+    ]
+    if delegated:
+        keys.append(AccountMeta(pubkey=get_collection_authority_record(collection_mint, collection_authority),
+                                is_signer=False, is_writable=False))
+    return TransactionInstruction(
+        keys=keys,
+        program_id=METADATA_PROGRAM_ID,
+        data=get_verify_collection_instruction(),
+    )
+
+
+    # ///   0. `[writable]` Metadata account
+    # ///   1. `[writable, signer]` Collection Authority
+    # ///   2. `[]` Mint of the Collection
+    # ///   3. `[]` Metadata Account of the Collection
+    # ///   4. `[]` MasterEdition2 Account of the Collection Token
+    # ///   5. Optional `[]` Collection Authority Record PDA, when the authority is a delegate
+
+def unverify_collection_instruction(mint, collection_authority, collection_mint, delegated=False):
+    from metadata import get_unverify_collection_instruction
+
+    keys = [
+        AccountMeta(pubkey=get_metadata_account(mint), is_signer=False, is_writable=True),
+        AccountMeta(pubkey=collection_authority, is_signer=True, is_writable=True),
+        AccountMeta(pubkey=collection_mint, is_signer=False, is_writable=False),
+        AccountMeta(pubkey=get_metadata_account(collection_mint), is_signer=False, is_writable=False),
+        AccountMeta(pubkey=get_edition(collection_mint), is_signer=False, is_writable=False),
+    ]
+    if delegated:
+        keys.append(AccountMeta(pubkey=get_collection_authority_record(collection_mint, collection_authority),
+                                is_signer=False, is_writable=False))
+    return TransactionInstruction(
+        keys=keys,
+        program_id=METADATA_PROGRAM_ID,
+        data=get_unverify_collection_instruction(),
+    )
+
+
+    # ///   0. `[writable]` Collection Authority Record PDA
+    # ///   1. `[]` A Collection Authority
+    # ///   2. `[signer]` Update Authority of Collection NFT
+    # ///   3. `[signer]` Payer
+    # ///   4. `[]` Collection Metadata account
+    # ///   5. `[]` Mint of Collection Metadata
+    # ///   6. `[]` System program
+    # ///   7. `[]` Rent info
+
+def approve_collection_authority_instruction(collection_mint, new_collection_authority, update_authority, payer):
+    from metadata import get_approve_collection_authority_instruction
+
+    keys = [
+        AccountMeta(pubkey=get_collection_authority_record(collection_mint, new_collection_authority),
+                    is_signer=False, is_writable=True),
+        AccountMeta(pubkey=new_collection_authority, is_signer=False, is_writable=False),
+        AccountMeta(pubkey=update_authority, is_signer=True, is_writable=True),
+        AccountMeta(pubkey=payer, is_signer=True, is_writable=True),
+        AccountMeta(pubkey=get_metadata_account(collection_mint), is_signer=False, is_writable=False),
+        AccountMeta(pubkey=collection_mint, is_signer=False, is_writable=False),
+        AccountMeta(pubkey=PublicKey(SYSTEM_PROGRAM_ID), is_signer=False, is_writable=False),
+        AccountMeta(pubkey=PublicKey(SYSVAR_RENT_PUBKEY), is_signer=False, is_writable=False),
+    ]
+    return TransactionInstruction(
+        keys=keys,
+        program_id=METADATA_PROGRAM_ID,
+        data=get_approve_collection_authority_instruction(),
+    )
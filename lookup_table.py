@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import base64
+import struct
+
+import base58
+from solana.publickey import PublicKey
+from solana.transaction import AccountMeta, TransactionInstruction
+from solana.utils.shortvec_encoding import encode_length
+
+ADDRESS_LOOKUP_TABLE_PROGRAM_ID = PublicKey('AddressLookupTab1e1111111111111111111111111')
+SYSTEM_PROGRAM_ID = PublicKey('11111111111111111111111111111111')
+
+# fixed size header in front of the address list of a lookup table account
+LOOKUP_TABLE_META_SIZE = 56
+MAX_LOOKUP_TABLE_ADDRESSES = 256
+# keeps an extend transaction comfortably under the packet size
+MAX_ADDRESSES_PER_EXTEND = 20
+MESSAGE_VERSION_PREFIX = 0x80
+# Sender only waits for confirmed, so the table is read back at the same commitment
+LOOKUP_TABLE_COMMITMENT = "confirmed"
+LOOKUP_TABLE_TIMEOUT = 60
+
+
+class LookupTable:
+
+    def __init__(self, address, addresses):
+        self.address = PublicKey(address)
+        self.addresses = [PublicKey(a) for a in addresses]
+        # PublicKey isn't hashable, index by the raw key bytes
+        self._index = {bytes(a): i for i, a in enumerate(self.addresses)}
+
+    def index_of(self, pubkey):
+        return self._index.get(bytes(pubkey))
+
+
+def get_lookup_table_address(authority, recent_slot):
+    return PublicKey.find_program_address(
+        [bytes(authority), struct.pack("<Q", recent_slot)],
+        ADDRESS_LOOKUP_TABLE_PROGRAM_ID
+    )
+
+
+def create_lookup_table_instruction(authority, payer, recent_slot):
+    table, bump = get_lookup_table_address(authority, recent_slot)
+    keys = [
+        AccountMeta(pubkey=table, is_signer=False, is_writable=True),
+        AccountMeta(pubkey=authority, is_signer=True, is_writable=False),
+        AccountMeta(pubkey=payer, is_signer=True, is_writable=True),
+        AccountMeta(pubkey=SYSTEM_PROGRAM_ID, is_signer=False, is_writable=False),
+    ]
+    data = struct.pack("<IQB", 0, recent_slot, bump)
+    return table, TransactionInstruction(keys=keys, program_id=ADDRESS_LOOKUP_TABLE_PROGRAM_ID, data=data)
+
+
+def extend_lookup_table_instruction(table, authority, payer, addresses):
+    keys = [
+        AccountMeta(pubkey=table, is_signer=False, is_writable=True),
+        AccountMeta(pubkey=authority, is_signer=True, is_writable=False),
+        AccountMeta(pubkey=payer, is_signer=True, is_writable=True),
+        AccountMeta(pubkey=SYSTEM_PROGRAM_ID, is_signer=False, is_writable=False),
+    ]
+    data = struct.pack("<IQ", 2, len(addresses)) + b"".join(bytes(a) for a in addresses)
+    return TransactionInstruction(keys=keys, program_id=ADDRESS_LOOKUP_TABLE_PROGRAM_ID, data=data)
+
+
+def parse_lookup_table_addresses(data):
+    return [PublicKey(data[i:i + 32]) for i in range(LOOKUP_TABLE_META_SIZE, len(data), 32)]
+
+
+def compile_v0_message(fee_payer, instructions, recent_blockhash, lookup_tables):
+    # signers and invoked programs always stay in the static key list, every other account found in one of the
+    # lookup tables is replaced by a one byte index into it. accounts are tracked by their raw key bytes
+    fee_payer = bytes(fee_payer)
+    metas = {fee_payer: [True, True]}
+    programs = set()
+    for ix in instructions:
+        for meta in ix.keys:
+            flags = metas.setdefault(bytes(meta.pubkey), [False, False])
+            flags[0] |= meta.is_signer
+            flags[1] |= meta.is_writable
+        metas.setdefault(bytes(ix.program_id), [False, False])
+        programs.add(bytes(ix.program_id))
+
+    static, loaded = [], {}
+    for key, (is_signer, _) in metas.items():
+        table = None
+        if not is_signer and key not in programs:
+            table = next((t for t in lookup_tables if t.index_of(key) is not None), None)
+        if table is None:
+            static.append(key)
+        else:
+            loaded[key] = table
+
+    # fee payer first, then writable signers, readonly signers, writable and readonly non signers
+    static.sort(key=lambda key: (key != fee_payer, not metas[key][0], not metas[key][1]))
+
+    lookups = []
+    loaded_writable, loaded_readonly = [], []
+    for table in lookup_tables:
+        writable = [k for k, t in loaded.items() if t is table and metas[k][1]]
+        readonly = [k for k, t in loaded.items() if t is table and not metas[k][1]]
+        if writable or readonly:
+            lookups.append((table, writable, readonly))
+            loaded_writable.extend(writable)
+            loaded_readonly.extend(readonly)
+
+    account_index = {k: i for i, k in enumerate(static + loaded_writable + loaded_readonly)}
+    num_signers = sum(1 for k in static if metas[k][0])
+    num_readonly_signed = sum(1 for k in static if metas[k][0] and not metas[k][1])
+    num_readonly_unsigned = sum(1 for k in static if not metas[k][0] and not metas[k][1])
+
+    message = bytes([MESSAGE_VERSION_PREFIX, num_signers, num_readonly_signed, num_readonly_unsigned])
+    message += encode_length(len(static)) + b"".join(static)
+    message += base58.b58decode(recent_blockhash)
+    message += encode_length(len(instructions))
+    for ix in instructions:
+        message += bytes([account_index[bytes(ix.program_id)]])
+        message += encode_length(len(ix.keys)) + bytes(account_index[bytes(meta.pubkey)] for meta in ix.keys)
+        message += encode_length(len(ix.data)) + bytes(ix.data)
+    message += encode_length(len(lookups))
+    for table, writable, readonly in lookups:
+        message += bytes(table.address)
+        message += encode_length(len(writable)) + bytes(table.index_of(k) for k in writable)
+        message += encode_length(len(readonly)) + bytes(table.index_of(k) for k in readonly)
+    return message, [PublicKey(k) for k in static[:num_signers]]
+
+
+def build_v0_transaction(instructions, signers, recent_blockhash, lookup_tables):
+    # signers[0] pays the fee
+    message, signer_keys = compile_v0_message(signers[0].public_key, instructions, recent_blockhash, lookup_tables)
+    by_key = {bytes(s.public_key): s for s in signers}
+    signatures = [by_key[bytes(k)].sign(message).signature for k in signer_keys]
+    return encode_length(len(signatures)) + b"".join(signatures) + message
+
+
+def v0_transaction_size(instructions, fee_payer, lookup_tables):
+    from pipeline import PLACEHOLDER_BLOCKHASH
+
+    message, signer_keys = compile_v0_message(fee_payer, instructions, PLACEHOLDER_BLOCKHASH, lookup_tables)
+    return len(encode_length(len(signer_keys))) + 64 * len(signer_keys) + len(message)
+
+
+def fetch_lookup_table(client, address, commitment=None):
+    resp = client.get_account_info(PublicKey(address), commitment=commitment, encoding="base64")
+    if resp["result"]["value"] is None:
+        return None
+    return LookupTable(address, parse_lookup_table_addresses(base64.b64decode(resp["result"]["value"]["data"][0])))
+
+
+def ensure_lookup_table(sender, authority, addresses, state_path):
+    # creates a lookup table holding addresses once per drop. the table address is kept in state_path so reruns
+    # of the same drop reuse it, and any addresses the table is missing are appended
+    client = sender.client()
+    table = None
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            table = fetch_lookup_table(client, json.loads(f.read())["address"], LOOKUP_TABLE_COMMITMENT)
+
+    if table is None:
+        recent_slot = client.get_slot(commitment="finalized")["result"]
+        address, ix = create_lookup_table_instruction(authority.public_key, authority.public_key, recent_slot)
+        signature, error = sender.send([ix], [authority])
+        if error is not None:
+            raise RuntimeError(f"failed to create lookup table: {error}")
+        with open(state_path, "w") as f:
+            f.write(json.dumps({"address": str(address)}))
+        table = LookupTable(address, [])
+
+    missing = [PublicKey(a) for a in dict.fromkeys(bytes(a) for a in addresses) if table.index_of(a) is None]
+    for i in range(0, len(missing), MAX_ADDRESSES_PER_EXTEND):
+        ix = extend_lookup_table_instruction(table.address, authority.public_key, authority.public_key,
+                                             missing[i:i + MAX_ADDRESSES_PER_EXTEND])
+        signature, error = sender.send([ix], [authority])
+        if error is not None:
+            raise RuntimeError(f"failed to extend lookup table: {error}")
+
+    if missing:
+        # extended addresses can only be looked up from the slot after the extension
+        extended_slot = client.get_slot(commitment=LOOKUP_TABLE_COMMITMENT)["result"]
+        while client.get_slot(commitment=LOOKUP_TABLE_COMMITMENT)["result"] <= extended_slot:
+            time.sleep(0.4)
+
+    # the rpc node can lag behind the one that confirmed the extension, so poll until it serves the whole table
+    address = table.address
+    deadline = time.time() + LOOKUP_TABLE_TIMEOUT
+    while True:
+        table = fetch_lookup_table(client, address, LOOKUP_TABLE_COMMITMENT)
+        if table is not None and all(table.index_of(a) is not None for a in addresses):
+            return table
+        if time.time() > deadline:
+            raise RuntimeError(f"lookup table {address} still missing addresses after {LOOKUP_TABLE_TIMEOUT}s")
+        time.sleep(0.4)
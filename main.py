@@ -4,17 +4,10 @@ import argparse
 
 from solana.publickey import PublicKey
 from solana.keypair import Keypair
-from solana.rpc.api import Client
-from solana.rpc.types import TxOpts
-from solana.transaction import Transaction
 
-
-from spl.token.core import _TokenCore
-from spl.token.client import Token
-from spl.token.instructions import get_associated_token_address
-
-from instruction_builder import mint_new_edition_from_master_edition_instruction, create_metadata_instruction
-from metadata import get_create_metadata_instruction
+from instruction_builder import mint_new_edition_from_master_edition_instruction, get_edition, get_metadata_account, \
+    get_edition_number_pda, SYSTEM_PROGRAM_ID, SYSVAR_RENT_PUBKEY
+from cluster_cache import get_rent_exempt_minimums, get_rent_exempt_minimum, METADATA_SIZE, EDITION_SIZE
 
 TESTNET = "https://api.testnet.solana.com"
 MAINNET = "https://ssc-dao.genesysgo.net/"
@@ -23,11 +16,12 @@ DEVNET = "https://api.devnet.solana.com"
 USENET = TESTNET
 
 def get_addresses_edition_numbers(address_file):
+    from recipients import RecipientTable
+
     with open(address_file) as f:
-        lines = filter(lambda x: "," in x, f.read().split("\n"))
-    edition_number_addresses = [l.split(",") for l in lines]
-    edition_number_addresses = [(PublicKey(l[0]),int(l[1])) for l in edition_number_addresses]
-    return edition_number_addresses
+        lines = filter(lambda x: "," in x, f)
+        edition_number_addresses = (l.split(",") for l in lines)
+        return RecipientTable.from_rows(((l[0], int(l[1]), 0) for l in edition_number_addresses), with_editions=True)
 
 def get_keypair(keypath):
     with open(keypath) as f:
@@ -57,6 +51,9 @@ def await_confirmation(client, signatures, max_timeout=60, target=20, finalized=
 
 def execute(api_endpoint, tx, signers, skip_confirmation=True, max_timeout=60, target=20,
             finalized=True):
+    from solana.rpc.api import Client
+    from solana.rpc.types import TxOpts
+
     client = Client(api_endpoint)
     try:
         result = client.send_transaction(tx, *signers, opts=TxOpts(skip_preflight=True))
@@ -70,6 +67,10 @@ def execute(api_endpoint, tx, signers, skip_confirmation=True, max_timeout=60, t
         print(traceback.format_exc())
 
 def get_instruction_batch_fresh_mint(conn, min_balance_mint, dest, payer):
+    from solana.rpc.types import TxOpts
+    from spl.token.core import _TokenCore
+    from spl.token.client import Token
+
     token, txn, payer, mint_account, opts = _TokenCore._create_mint_args(
         conn, payer, payer.public_key, 0, PublicKey("TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA"), payer.public_key, True, min_balance_mint, Token
     )
@@ -82,6 +83,36 @@ def get_instruction_batch_fresh_mint(conn, min_balance_mint, dest, payer):
 
     return new_mint_key, txn
 
+def get_instruction_batch_edition(conn, min_balance_mint, dest, edition_number, master_mint, master_token_account, payer):
+    new_mint_token, txn = get_instruction_batch_fresh_mint(conn, min_balance_mint, dest, payer)
+    mint_new_edition_from_master_edition = mint_new_edition_from_master_edition_instruction(edition_number, master_mint,
+                                                                                            new_mint_token.public_key,
+                                                                                            payer.public_key,
+                                                                                            mint_authority = payer.public_key,
+                                                                                            new_mint_authority = payer.public_key,
+                                                                                            master_token_account_owner = payer.public_key,
+                                                                                            master_token_account = master_token_account,
+                                                                                            payer = payer.public_key)
+    txn.add(mint_new_edition_from_master_edition)
+    return new_mint_token, txn
+
+def get_edition_entries(conn, min_balance_mint, address_edition_numbers, master_mint, master_token_account, payer):
+    for dest_address, edition_number in address_edition_numbers:
+        new_mint_token, txn = get_instruction_batch_edition(conn, min_balance_mint, dest_address, edition_number,
+                                                            master_mint, master_token_account, payer)
+        yield f"{dest_address},{edition_number}", txn.instructions, [payer, new_mint_token]
+
+def get_edition_lookup_addresses(master_mint, master_token_account, edition_numbers):
+    # accounts shared by every edition mint of a drop. invoked programs can't be looked up so they are left out
+    from lookup_table import MAX_LOOKUP_TABLE_ADDRESSES
+
+    addresses = [get_edition(master_mint), get_metadata_account(master_mint), master_token_account,
+                 SYSTEM_PROGRAM_ID, SYSVAR_RENT_PUBKEY]
+    # one edition marker pda per 248 editions, as many as still fit in the table
+    buckets = sorted({e // 248 for e in edition_numbers})[:MAX_LOOKUP_TABLE_ADDRESSES - len(addresses)]
+    addresses += [get_edition_number_pda(master_mint, b * 248) for b in buckets]
+    return addresses
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='candy machine configurations')
     parser.add_argument('--usenet', action="store", choices=["devnet", "testnet", "mainnet"],
@@ -94,6 +125,21 @@ if __name__ == "__main__":
     parser.add_argument('airdrop_file', action="store", help='file containing addresses and edition numbers to drop. '
                                                              'Each line MUST be <address>,<edition_number>. '
                                                              'this file should not change. can be retried since edition numbers are bound to an address')
+    parser.add_argument('--refresh-constants', action="store_true",
+                        help='ignore the cached rent exempt minimums and fetch them from the cluster again')
+    parser.add_argument('--lookup-table', action="store_true",
+                        help='send v0 transactions through an address lookup table created once per drop, '
+                             'packing several editions per transaction')
+    parser.add_argument('--per-tx', action="store", type=int, default=2,
+                        help='max editions per transaction with --lookup-table, bounded by the compute limit')
+    parser.add_argument('--workers', action="store", type=int, default=8,
+                        help='number of transactions in flight at once with --lookup-table')
+    parser.add_argument('--plan', action="store_true",
+                        help='build every transaction without sending and report count, sizes, cost and duration')
+    parser.add_argument('--plan-rate', action="store", type=float, default=4,
+                        help='send rate in transactions per second used to project the duration of --plan')
+    parser.add_argument('--plan-sample', action="store", type=int, default=20,
+                        help='number of planned transactions to simulate, 0 to skip simulation')
 
     args = parser.parse_args()
     use_network = USENET
@@ -106,6 +152,9 @@ if __name__ == "__main__":
     if args.customnet:
         use_network = args.customnet
 
+    from solana.rpc.api import Client
+    from spl.token.instructions import get_associated_token_address
+
     http_client = Client(use_network)
 
     source_account = get_keypair(args.payment_key)
@@ -115,7 +164,7 @@ if __name__ == "__main__":
     address_edition_numbers = get_addresses_edition_numbers(airdrop_file)
 
     assoc_ta_of_master_mint = get_associated_token_address(source_account.public_key, master_edition)
-    min_balance = Token.get_min_balance_rent_for_exempt_for_mint(http_client)
+    min_balance, min_balance_token_account = get_rent_exempt_minimums(use_network, refresh=args.refresh_constants)
 #    create_metadata_ix = create_metadata_instruction(
 #            data=get_create_metadata_instruction("Revival Punks NY 2022",
 #                                         "RPS_Drops",
@@ -140,20 +189,59 @@ if __name__ == "__main__":
 #    txn.add(create_metadata_ix)
 #    signers = [source_account]
 
-    for c, (dest_address, edition_number) in enumerate(address_edition_numbers):
-        new_mint_token, txn = get_instruction_batch_fresh_mint(http_client, min_balance, dest_address, source_account)
-        mint_new_edition_from_master_edition = mint_new_edition_from_master_edition_instruction(edition_number, master_edition,
-                                                                                                new_mint_token.public_key,
-                                                                                                source_account.public_key,
-                                                                                                mint_authority = source_account.public_key,
-                                                                                                new_mint_authority = source_account.public_key,
-                                                                                                master_token_account_owner = source_account.public_key,
-                                                                                                master_token_account =assoc_ta_of_master_mint,
-                                                                                                payer = source_account.public_key)
-
-        txn.add(mint_new_edition_from_master_edition)
-        signers = [source_account, new_mint_token]
-        print(execute(use_network, txn, signers, True))
-
-
-
+    lookup_state_path = f"{airdrop_file}.lookup_table"
+
+    if args.plan:
+        from planner import plan_drop, planned_lookup_table, print_plan, simulate_sample
+        from pipeline import Sender, pack_instructions
+
+        sender = Sender(use_network)
+        can_simulate = True
+        if args.lookup_table:
+            lookup_addresses = get_edition_lookup_addresses(master_edition, assoc_ta_of_master_mint,
+                                                            address_edition_numbers.editions.tolist())
+            table, can_simulate = planned_lookup_table(sender, lookup_addresses, lookup_state_path)
+            sender.lookup_tables = [table]
+        # a new mint, its token account, metadata and edition per edition
+        rent_per_edition = (min_balance + min_balance_token_account +
+                            get_rent_exempt_minimum(use_network, METADATA_SIZE, refresh=args.refresh_constants) +
+                            get_rent_exempt_minimum(use_network, EDITION_SIZE, refresh=args.refresh_constants))
+        entries = get_edition_entries(http_client, min_balance, address_edition_numbers, master_edition,
+                                      assoc_ta_of_master_mint, source_account)
+        batches = pack_instructions(entries, source_account.public_key,
+                                    max_entries=args.per_tx if args.lookup_table else 1,
+                                    lookup_tables=sender.lookup_tables)
+        plan = plan_drop(batches, lambda keys, instructions: len(keys) * rent_per_edition, args.plan_sample,
+                         sender.lookup_tables)
+        failures = None
+        if args.plan_sample and can_simulate:
+            failures = simulate_sample(sender, plan.sample, args.workers)
+        elif args.plan_sample:
+            print("lookup table not created yet, skipping simulation")
+        lamports_per_signature = http_client.get_recent_blockhash()["result"]["value"]["feeCalculator"]["lamportsPerSignature"]
+        print_plan(plan, lamports_per_signature, args.plan_rate, failures)
+    elif args.lookup_table:
+        from lookup_table import ensure_lookup_table
+        from pipeline import Journal, Sender, pack_instructions, pending_entries, run_pipeline
+
+        sender = Sender(use_network)
+        lookup_addresses = get_edition_lookup_addresses(master_edition, assoc_ta_of_master_mint,
+                                                        address_edition_numbers.editions.tolist())
+        sender.lookup_tables = [ensure_lookup_table(sender, source_account, lookup_addresses, lookup_state_path)]
+        journal = Journal(f"{airdrop_file}.journal")
+
+        # rows already in the journal are dropped before their mint keypair and pdas are derived
+        pending = pending_entries(address_edition_numbers, journal, key=lambda row: f"{row[0]},{row[1]}")
+        entries = get_edition_entries(http_client, min_balance, pending, master_edition,
+                                      assoc_ta_of_master_mint, source_account)
+        batches = pack_instructions(entries, source_account.public_key,
+                                    max_entries=args.per_tx, lookup_tables=sender.lookup_tables)
+        sent, failed = run_pipeline(sender, batches, journal, args.workers)
+        journal.close()
+        print(f"{sent} transactions landed, {failed} failed. {len(journal.done)} editions done in total")
+    else:
+        for c, (dest_address, edition_number) in enumerate(address_edition_numbers):
+            new_mint_token, txn = get_instruction_batch_edition(http_client, min_balance, dest_address, edition_number,
+                                                                master_edition, assoc_ta_of_master_mint, source_account)
+            signers = [source_account, new_mint_token]
+            print(execute(use_network, txn, signers, True))
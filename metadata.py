@@ -79,7 +79,7 @@ UpdateMetadataAccountArgs = CStruct(
     "data" / Option(Data),
     "update_authority" / Option(PubKey),
     "primary_sale_happened" / Option(Bool),
-    "collection" / Option(Collection)
+    "is_mutable" / Option(Bool)
 )
 
 UpdateInstructionLayout = CStruct(
@@ -97,6 +97,33 @@ CreateMasterEditionLayout = CStruct (
     "args" / CreateMasterEditionArgs,
 )
 
+CollectionInstructionLayout = CStruct (
+    "instruction_type" / InstructionType,
+)
+
+# on chain metadata account. the account is zero padded, so fields added by later program versions parse as None
+
+MetadataAccountData = CStruct(
+    "name" / String,
+    "symbol" / String,
+    "uri" / String,
+    "seller_fee_basis_points" / U16,
+    "creators" / Option(Vec(Creator)),
+)
+
+MetadataAccount = CStruct(
+    "key" / U8,
+    "update_authority" / PubKey,
+    "mint" / PubKey,
+    "data" / MetadataAccountData,
+    "primary_sale_happened" / Bool,
+    "is_mutable" / Bool,
+    "edition_nonce" / Option(U8),
+    "token_standard" / Option(U8),
+    "collection" / Option(Collection),
+    "uses" / Option(Uses),
+)
+
 MintNewEditionFromMasterEditionViaTokenArgs = CStruct (
     "edition" / U64
 )
@@ -127,7 +154,8 @@ def get_create_metadata_instruction(name, symbol, uri, fee, is_mutable=False, cr
     )
 
 
-def get_update_metadata_instruction(name, symbol, uri, fee, update_authority, primary_sale_happened=None, creators=None, collection = None):
+def get_update_metadata_instruction(name, symbol, uri, fee, update_authority, primary_sale_happened=None, creators=None, collection = None,
+                                    is_mutable=None, uses=None):
     return UpdateInstructionLayout.build({
         "instruction_type": InstructionType.enum.UpdateMetadataAccountV2(),
         "args": {
@@ -138,10 +166,12 @@ def get_update_metadata_instruction(name, symbol, uri, fee, update_authority, pr
                     "uri": uri,
                     "seller_fee_basis_points": fee,
                     "creators": creators,
+                    "collection": collection,
+                    "uses": uses
                 },
-            "update_authority": {"pub_key": update_authority},
+            "update_authority": {"pub_key": update_authority} if update_authority is not None else None,
             "primary_sale_happened": primary_sale_happened,
-            "collection": collection}
+            "is_mutable": is_mutable}
     })
 
 def get_create_master_edition_instruction(max_supply):
@@ -157,3 +187,27 @@ def get_mint_new_edition_from_master_edition_instruction(edition_num):
         "args":
             {"edition": edition_num}
     })
+
+def get_verify_collection_instruction():
+    return CollectionInstructionLayout.build({
+        "instruction_type": InstructionType.enum.VerifyCollection()
+    })
+
+def get_unverify_collection_instruction():
+    return CollectionInstructionLayout.build({
+        "instruction_type": InstructionType.enum.UnverifyCollection()
+    })
+
+def get_approve_collection_authority_instruction():
+    return CollectionInstructionLayout.build({
+        "instruction_type": InstructionType.enum.ApproveCollectionAuthority()
+    })
+
+
+def parse_metadata_account(data):
+    account = MetadataAccount.parse(data)
+    # names, symbols and uris are stored null padded to their max length
+    account.data.name = account.data.name.rstrip("\x00")
+    account.data.symbol = account.data.symbol.rstrip("\x00")
+    account.data.uri = account.data.uri.rstrip("\x00")
+    return account
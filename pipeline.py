@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import base58
+from solana.transaction import Transaction
+
+# max serialized transaction size accepted by the cluster
+PACKET_DATA_SIZE = 1232
+# any valid 32 byte base58 string works for sizing a message before a real blockhash is fetched
+PLACEHOLDER_BLOCKHASH = "11111111111111111111111111111111"
+# journal status of keys whose transaction could neither be confirmed nor shown to have expired
+UNKNOWN = "unknown"
+
+
+def transaction_size(instructions, fee_payer, lookup_tables=None):
+    from solana.utils.shortvec_encoding import encode_length
+
+    if lookup_tables:
+        from lookup_table import v0_transaction_size
+        return v0_transaction_size(instructions, fee_payer, lookup_tables)
+
+    txn = Transaction(recent_blockhash=PLACEHOLDER_BLOCKHASH, fee_payer=fee_payer)
+    txn.add(*instructions)
+    message = txn.compile_message()
+    num_signatures = message.header.num_required_signatures
+    return len(encode_length(num_signatures)) + 64 * num_signatures + len(message.serialize())
+
+
+def pack_instructions(entries, fee_payer, max_size=PACKET_DATA_SIZE, max_entries=None, lookup_tables=None):
+    # entries are (key, instructions, signers) for one logical item. items are packed greedily
+    # into (keys, instructions, signers) batches that still fit in a single transaction.
+    # max_entries caps items per transaction for instructions that hit the compute limit before the size limit
+    keys, instructions, signers = [], [], []
+    for key, entry_instructions, entry_signers in entries:
+        candidate = instructions + list(entry_instructions)
+        if instructions and (len(keys) == max_entries or transaction_size(candidate, fee_payer, lookup_tables) > max_size):
+            yield keys, instructions, signers
+            keys, instructions, signers = [], [], []
+            candidate = list(entry_instructions)
+        if transaction_size(candidate, fee_payer, lookup_tables) > max_size:
+            raise ValueError(f"instructions for {key} do not fit in a single transaction")
+        keys.append(key)
+        instructions = candidate
+        signers.extend(s for s in entry_signers if s.public_key not in [x.public_key for x in signers])
+    if instructions:
+        yield keys, instructions, signers
+
+
+class Journal:
+    # append only record of keys that landed, one json line per key. a rerun with the same journal skips them.
+    # keys whose transaction may or may not have landed are recorded with status unknown and skipped too,
+    # until they have been checked on chain
+
+    def __init__(self, path):
+        self.path = path
+        self.done = {}
+        self.unknown = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        if entry.get("status") == UNKNOWN:
+                            self.unknown[entry["key"]] = entry
+                        else:
+                            self.unknown.pop(entry["key"], None)
+                            self.done[entry["key"]] = entry
+        self._f = open(path, "a")
+
+    def __contains__(self, key):
+        return key in self.done or key in self.unknown
+
+    def _write(self, keys, signature, target, extra):
+        with self._lock:
+            for key in keys:
+                entry = dict(extra, key=key, signature=signature)
+                target[key] = entry
+                self._f.write(json.dumps(entry) + "\n")
+            self._f.flush()
+            os.fsync(self._f.fileno())
+
+    def record(self, keys, signature, **extra):
+        self._write(keys, signature, self.done, extra)
+
+    def record_unknown(self, keys, signature, **extra):
+        self._write(keys, signature, self.unknown, dict(extra, status=UNKNOWN))
+
+    def close(self):
+        self._f.close()
+
+
+class BlockhashCache:
+
+    def __init__(self, api_endpoint, max_age=20):
+        self.api_endpoint = api_endpoint
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._blockhash = None
+        self._fetched_at = 0
+
+    def get(self, client, refresh=False):
+        with self._lock:
+            if refresh or self._blockhash is None or time.time() - self._fetched_at > self.max_age:
+                resp = client.get_recent_blockhash()
+                self._blockhash = resp["result"]["value"]["blockhash"]
+                self._fetched_at = time.time()
+            return self._blockhash
+
+
+def _signature_status(client, signature):
+    resp = client.get_signature_statuses([signature])
+    return resp["result"]["value"][0]
+
+
+def _await_landed(client, signature, blockhash, confirm_timeout, poll_interval=1):
+    # returns the signature status once confirmed, or None once the blockhash expired without it landing.
+    # waiting for expiry instead of a fixed timeout means a retry can never double apply a transfer
+    started = time.time()
+    while True:
+        time.sleep(poll_interval)
+        status = _signature_status(client, signature)
+        if status is not None and status["confirmationStatus"] in ("confirmed", "finalized"):
+            return status
+        if time.time() - started > confirm_timeout:
+            resp = client.get_fee_calculator_for_blockhash(blockhash)
+            if resp["result"]["value"] is None:
+                return _signature_status(client, signature)
+
+
+def _await_settled(client, signature, blockhash, timeout, poll_interval=1):
+    # after an rpc error the transaction may already be on its way and can land until its blockhash expires.
+    # keeps polling through errors until it either landed or expired, raising TimeoutError if that can't be told
+    started = time.time()
+    while time.time() - started < timeout:
+        try:
+            return _await_landed(client, signature, blockhash, 0, poll_interval)
+        except Exception:
+            time.sleep(poll_interval)
+    raise TimeoutError(f"could not tell whether {signature} landed within {timeout}s")
+
+
+class UnknownOutcome:
+    # error returned by Sender.send when a broadcast transaction may still have landed
+
+    def __init__(self, message):
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+    __repr__ = __str__
+
+
+def _first_signature(raw):
+    # the transaction id is its first signature, right after the shortvec signature count
+    from solana.utils.shortvec_encoding import decode_length
+
+    _, offset = decode_length(raw)
+    return base58.b58encode(raw[offset:offset + 64]).decode("utf-8")
+
+
+class Sender:
+
+    def __init__(self, api_endpoint, skip_preflight=True, confirm_timeout=60, max_attempts=3, lookup_tables=None,
+                 settle_timeout=300):
+        self.api_endpoint = api_endpoint
+        # when set, transactions are sent as v0 messages resolving accounts through these tables
+        self.lookup_tables = lookup_tables
+        self.skip_preflight = skip_preflight
+        self.confirm_timeout = confirm_timeout
+        self.max_attempts = max_attempts
+        self.settle_timeout = settle_timeout
+        self.blockhashes = BlockhashCache(api_endpoint)
+        self._local = threading.local()
+
+    def client(self):
+        if not hasattr(self._local, "client"):
+            from solana.rpc.api import Client
+            self._local.client = Client(self.api_endpoint)
+        return self._local.client
+
+    def build(self, instructions, signers, blockhash):
+        if self.lookup_tables:
+            from lookup_table import build_v0_transaction
+            return build_v0_transaction(instructions, signers, blockhash, self.lookup_tables)
+        txn = Transaction(recent_blockhash=blockhash, fee_payer=signers[0].public_key)
+        txn.add(*instructions)
+        txn.sign(*signers)
+        return txn.serialize()
+
+    def send(self, instructions, signers):
+        # returns (signature, error). error is None only when the transaction confirmed without a program error,
+        # and an UnknownOutcome when it was broadcast but whether it landed couldn't be told
+        from solana.rpc.types import TxOpts
+
+        client = self.client()
+        error = None
+        for attempt in range(self.max_attempts):
+            try:
+                blockhash = self.blockhashes.get(client, refresh=attempt > 0)
+                raw = self.build(instructions, signers, blockhash)
+            except Exception as e:
+                error = repr(e)
+                continue
+            signature = _first_signature(raw)
+            try:
+                resp = client.send_raw_transaction(raw, opts=TxOpts(skip_preflight=self.skip_preflight))
+                if "error" in resp:
+                    error = resp["error"]
+                    continue
+                status = _await_landed(client, signature, blockhash, self.confirm_timeout)
+            except Exception as e:
+                # a timed out send or status poll doesn't mean the transaction wasn't broadcast,
+                # so it is only rebuilt once its blockhash is known to have expired without it
+                error = repr(e)
+                try:
+                    status = _await_settled(client, signature, blockhash, self.settle_timeout)
+                except TimeoutError as e:
+                    return signature, UnknownOutcome(f"{error}, {e}")
+            if status is None:
+                error = "blockhash expired before confirmation"
+                continue
+            return signature, status["err"]
+        return None, error
+
+
+def pending_entries(entries, journal, key=lambda entry: entry[0]):
+    # drop items already recorded in the journal before they are packed, so a resumed run only sends what is left
+    return (entry for entry in entries if key(entry) not in journal)
+
+
+def run_pipeline(sender, batches, journal, workers=8):
+    # batches are (keys, instructions, signers), optionally followed by a dict of extra fields to journal with
+    # every key. at most 2 * workers transactions are built ahead of the senders
+    # so arbitrarily large inputs can be streamed through
+    sent, failed = 0, 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+
+        def drain():
+            nonlocal sent, failed
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                keys, extra = pending.pop(future)
+                try:
+                    signature, error = future.result()
+                except Exception as e:
+                    signature, error = None, repr(e)
+                if error is None:
+                    journal.record(keys, signature, **extra)
+                    sent += 1
+                    print(f"{signature} {len(keys)} items")
+                elif isinstance(error, UnknownOutcome):
+                    journal.record_unknown(keys, signature, **extra)
+                    failed += 1
+                    print(f"UNKNOWN {','.join(keys)}: {error}. skipped on rerun until checked on chain")
+                else:
+                    failed += 1
+                    print(f"FAILED {','.join(keys)}: {error}")
+
+        # whatever stops the loop, transactions already in flight can still land and have to be journaled
+        try:
+            for batch in batches:
+                keys, instructions, signers = batch[:3]
+                extra = batch[3] if len(batch) > 3 else {}
+                pending[executor.submit(sender.send, instructions, signers)] = keys, extra
+                if len(pending) >= 2 * workers:
+                    drain()
+        finally:
+            while pending:
+                drain()
+    return sent, failed
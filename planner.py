@@ -0,0 +1,114 @@
+import os
+import json
+import base64
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+from solana.publickey import PublicKey
+
+from pipeline import PACKET_DATA_SIZE, transaction_size
+
+# width of the buckets in the printed size histogram
+SIZE_BUCKET = 128
+
+
+class DropPlan:
+
+    def __init__(self):
+        self.items = 0
+        self.transactions = 0
+        self.signatures = 0
+        self.rent = 0
+        self.size_counts = [0] * (PACKET_DATA_SIZE + 1)
+        self.sample = []
+
+    def add(self, keys, instructions, signers, size, rent, sample_size):
+        self.items += len(keys)
+        self.transactions += 1
+        self.signatures += len(signers)
+        self.rent += rent
+        self.size_counts[size] += 1
+        # reservoir sample so the whole drop never has to be held in memory
+        if len(self.sample) < sample_size:
+            self.sample.append((keys, instructions, signers))
+        else:
+            i = random.randrange(self.transactions)
+            if i < sample_size:
+                self.sample[i] = (keys, instructions, signers)
+
+    def size_percentile(self, p):
+        target = p * self.transactions
+        seen = 0
+        for size, count in enumerate(self.size_counts):
+            seen += count
+            if count and seen >= target:
+                return size
+        return 0
+
+
+def planned_lookup_table(sender, addresses, state_path):
+    # the table a real run would use. returns (table, exists), with a stand in table for sizing when the drop
+    # hasn't created one yet, since transactions referencing it can't be simulated
+    from lookup_table import LookupTable, fetch_lookup_table
+
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            table = fetch_lookup_table(sender.client(), json.loads(f.read())["address"])
+        if table is not None and all(table.index_of(a) is not None for a in addresses):
+            return table, True
+    return LookupTable(PublicKey(bytes(32)), addresses), False
+
+
+def plan_drop(batches, rent_of, sample_size=20, lookup_tables=None):
+    # batches are what a real run would send, (keys, instructions, signers) optionally followed by the extra fields
+    # run_pipeline journals. rent_of(keys, instructions) returns the rent a batch pays for
+    plan = DropPlan()
+    for batch in batches:
+        keys, instructions, signers = batch[:3]
+        size = transaction_size(instructions, signers[0].public_key, lookup_tables)
+        if size > PACKET_DATA_SIZE:
+            raise ValueError(f"transaction for {','.join(keys)} is {size} bytes")
+        plan.add(keys, instructions, signers, size, rent_of(keys, instructions), sample_size)
+    return plan
+
+
+def simulate_sample(sender, sample, workers=8):
+    # returns (keys, err, logs) for every sampled transaction that would fail
+    def simulate(batch):
+        keys, instructions, signers = batch
+        client = sender.client()
+        raw = sender.build(instructions, signers, sender.blockhashes.get(client))
+        # raw bytes are taken as already base64 encoded by simulate_transaction
+        resp = client.simulate_transaction(base64.b64encode(raw).decode("utf-8"))
+        if "error" in resp:
+            return keys, resp["error"], []
+        value = resp["result"]["value"]
+        return keys, value["err"], value.get("logs") or []
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return [r for r in executor.map(simulate, sample) if r[1] is not None]
+
+
+def print_plan(plan, lamports_per_signature, send_rate, failures=None):
+    fees = plan.signatures * lamports_per_signature
+    print(f"items:            {plan.items}")
+    print(f"transactions:     {plan.transactions}")
+    print(f"signatures:       {plan.signatures}")
+    if plan.transactions:
+        print(f"size p50/p90/max: {plan.size_percentile(0.5)}/{plan.size_percentile(0.9)}/{plan.size_percentile(1)}"
+              f" bytes of {PACKET_DATA_SIZE}")
+        for start in range(0, PACKET_DATA_SIZE + 1, SIZE_BUCKET):
+            count = sum(plan.size_counts[start:start + SIZE_BUCKET])
+            if count:
+                print(f"  {start:>4}-{min(start + SIZE_BUCKET - 1, PACKET_DATA_SIZE):<4} {count}")
+    print(f"rent:             {plan.rent} lamports ({plan.rent / 1e9:.4f} SOL)")
+    print(f"fees:             {fees} lamports ({fees / 1e9:.4f} SOL)")
+    print(f"total:            {(plan.rent + fees) / 1e9:.4f} SOL")
+    print(f"duration:         {plan.transactions / send_rate:.0f}s at {send_rate} tx/s")
+    if failures is None:
+        return
+    print(f"simulated:        {len(plan.sample)} transactions, {len(failures)} failed")
+    for keys, err, logs in failures:
+        print(f"FAILED {','.join(keys)}: {err}")
+        for line in logs[-5:]:
+            print(f"    {line}")
@@ -0,0 +1,83 @@
+from array import array
+
+import base58
+import numpy as np
+from solana.publickey import PublicKey
+
+# editions sharing floor(edition / EDITION_MARKER_BIT_SIZE) share an edition marker pda
+EDITION_MARKER_BIT_SIZE = 248
+# lets numpy compare, sort and dedupe whole 32 byte keys at once
+KEY_DTYPE = np.dtype((np.void, 32))
+
+
+class RecipientTable:
+    # recipients of a drop as one contiguous (n, 32) key buffer plus optional uint64 edition and amount columns,
+    # about 48 bytes a row instead of a PublicKey object and tuple. slicing returns views, not copies.
+    # iterating yields (PublicKey, edition) or (PublicKey, amount) tuples like the old list based loaders
+
+    def __init__(self, keys, editions=None, amounts=None):
+        self.keys = keys
+        self.editions = editions
+        self.amounts = amounts
+
+    @classmethod
+    def from_rows(cls, rows, with_editions=False, with_amounts=False):
+        # rows are (base58 address, edition, amount), unused columns are ignored
+        keys, editions, amounts = bytearray(), array("Q"), array("Q")
+        for address, edition, amount in rows:
+            key = base58.b58decode(address.strip())
+            if len(key) != 32:
+                raise ValueError(f"invalid address {address}")
+            keys += key
+            if with_editions:
+                editions.append(edition)
+            if with_amounts:
+                amounts.append(amount)
+        return cls(
+            np.frombuffer(bytes(keys), dtype=np.uint8).reshape(-1, 32),
+            np.frombuffer(editions, dtype=np.uint64) if with_editions else None,
+            np.frombuffer(amounts, dtype=np.uint64) if with_amounts else None,
+        )
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getitem__(self, index):
+        return RecipientTable(
+            self.keys[index],
+            self.editions[index] if self.editions is not None else None,
+            self.amounts[index] if self.amounts is not None else None,
+        )
+
+    def __iter__(self):
+        values = self.editions if self.editions is not None else self.amounts
+        for i in range(len(self.keys)):
+            yield PublicKey(self.keys[i].tobytes()), int(values[i]) if values is not None else None
+
+    def key(self, i):
+        return PublicKey(self.keys[i].tobytes())
+
+    def _group(self):
+        _, first, inverse = np.unique(self.keys.view(KEY_DTYPE).ravel(), return_index=True, return_inverse=True)
+        return first, inverse.ravel()
+
+    def merge_duplicates(self):
+        # one row per address, in first seen order, with the amounts of repeated addresses summed
+        first, inverse = self._group()
+        amounts = None
+        if self.amounts is not None:
+            amounts = np.zeros(len(first), dtype=np.uint64)
+            np.add.at(amounts, inverse, self.amounts)
+        order = np.argsort(first, kind="stable")
+        return RecipientTable(
+            self.keys[first[order]],
+            self.editions[first[order]] if self.editions is not None else None,
+            amounts[order] if amounts is not None else None,
+        )
+
+    def edition_buckets(self):
+        return self.editions // EDITION_MARKER_BIT_SIZE
+
+    def batches(self, size):
+        for i in range(0, len(self), size):
+            yield self[i:i + size]
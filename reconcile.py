@@ -0,0 +1,159 @@
+import argparse
+import struct
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from solana.publickey import PublicKey
+
+from bulk_read import fetch_accounts
+from instruction_builder import get_edition_number_pda
+from recipients import RecipientTable, EDITION_MARKER_BIT_SIZE
+
+TESTNET = "https://api.testnet.solana.com"
+MAINNET = "https://ssc-dao.genesysgo.net/"
+DEVNET = "https://api.devnet.solana.com"
+
+USENET = TESTNET
+
+# token account layout: mint, owner, then the u64 amount
+TOKEN_ACCOUNT_AMOUNT_OFFSET = 64
+# edition marker layout: a one byte key, then 31 bytes holding one bit per edition
+EDITION_MARKER_LEDGER = slice(1, 32)
+DERIVE_CHUNK = 5000
+
+
+def _derive_token_accounts(args):
+    from spl.token.instructions import get_associated_token_address
+
+    keys, mint = args
+    mint = PublicKey(mint)
+    return b"".join(bytes(get_associated_token_address(PublicKey(keys[i:i + 32]), mint))
+                    for i in range(0, len(keys), 32))
+
+
+def derive_token_accounts(table, mint_key, processes=None):
+    # the pda search behind every associated token address is slow enough in python to spread over processes
+    jobs = [(batch.keys.tobytes(), bytes(mint_key)) for batch in table.batches(DERIVE_CHUNK)]
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        derived = b"".join(executor.map(_derive_token_accounts, jobs))
+    return [PublicKey(derived[i:i + 32]) for i in range(0, len(derived), 32)]
+
+
+def reconcile_tokens(api_endpoint, table, mint_key, workers=16):
+    # table holds one row per address with the amount it should have. returns the balance of each row,
+    # 0 where the associated token account doesn't exist
+    accounts = fetch_accounts(api_endpoint, derive_token_accounts(table, mint_key), workers)
+    return np.array([struct.unpack_from("<Q", data, TOKEN_ACCOUNT_AMOUNT_OFFSET)[0] if data is not None else 0
+                     for data in accounts], dtype=np.uint64)
+
+
+def reconcile_editions(api_endpoint, table, master_mint, workers=16):
+    # returns whether each row's edition number has been minted, read from the edition marker bitmaps.
+    # the markers only record that an edition exists, not which wallet it went to
+    buckets = np.unique(table.edition_buckets())
+    markers = fetch_accounts(api_endpoint, [get_edition_number_pda(master_mint, int(b) * EDITION_MARKER_BIT_SIZE)
+                                            for b in buckets], workers)
+    ledgers = np.zeros((len(buckets), 31), dtype=np.uint8)
+    for i, data in enumerate(markers):
+        if data is not None:
+            ledgers[i] = np.frombuffer(data[EDITION_MARKER_LEDGER], dtype=np.uint8)
+    offsets = table.editions % EDITION_MARKER_BIT_SIZE
+    masks = np.left_shift(1, 7 - (offsets % 8)).astype(np.uint8)
+    rows = ledgers[np.searchsorted(buckets, table.edition_buckets()), (offsets // 8).astype(np.intp)]
+    return (rows & masks) != 0
+
+
+def load_addresses(airdrop_file, kind):
+    if kind == "editions":
+        from main import get_addresses_edition_numbers
+        return get_addresses_edition_numbers(airdrop_file)
+    if kind == "amounts":
+        from wdao_token_drop import get_address_list
+        return get_address_list(airdrop_file)
+    from fungible import get_address_list
+    return get_address_list(airdrop_file)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='check which recipients of a drop actually received it')
+    parser.add_argument('--usenet', action="store", choices=["devnet", "testnet", "mainnet"],
+                        help='cluster to read from')
+    parser.add_argument('--customnet', action="store",
+                        help='custom rpc endpoint to hit')
+    parser.add_argument('--workers', action="store", type=int, default=16,
+                        help='number of getMultipleAccounts requests in flight at once')
+    parser.add_argument('--report', action="store",
+                        help='csv of <address>,<expected>,<actual>,<lines>,<status> per recipient. '
+                             'defaults to <airdrop_file>.reconcile.csv')
+    parser.add_argument('--retry', action="store",
+                        help='recipients that still need the drop, in the format of airdrop_file. '
+                             'defaults to <airdrop_file>.retry')
+
+    parser.add_argument('kind', action="store", choices=["editions", "fungible", "amounts"],
+                        help='editions for main.py drops, fungible for fungible.py, amounts for wdao_token_drop.py')
+    parser.add_argument('mint_key', action="store", help='master edition mint for editions, token mint otherwise')
+    parser.add_argument('airdrop_file', action="store", help='the airdrop file the drop was run with')
+
+    args = parser.parse_args()
+    use_network = USENET
+
+    if args.usenet == "testnet":
+        use_network = TESTNET
+    elif args.usenet == "mainnet":
+        use_network = MAINNET
+
+    if args.customnet:
+        use_network = args.customnet
+
+    mint_key = PublicKey(args.mint_key)
+    table = load_addresses(args.airdrop_file, args.kind)
+
+    if args.kind == "editions":
+        minted = reconcile_editions(use_network, table, mint_key, args.workers)
+        # only one of the lines sharing an edition number can ever be minted, those need fixing by hand
+        _, inverse, edition_counts = np.unique(table.editions, return_inverse=True, return_counts=True)
+        lines = edition_counts[inverse.ravel()]
+        expected, actual = np.ones(len(table), dtype=np.uint64), minted.astype(np.uint64)
+        status = np.where(lines > 1, "duplicated", np.where(minted, "complete", "missing"))
+        retry = [f"{address},{edition}" for (address, edition), s in zip(table, status) if s == "missing"]
+    else:
+        # lines per address, in the same first seen order merge_duplicates uses
+        lines = RecipientTable(table.keys, None, np.ones(len(table), dtype=np.uint64)).merge_duplicates().amounts
+        table = table.merge_duplicates()
+        if args.kind == "fungible":
+            # fungible.py sends a single token per address however often it is listed
+            table.amounts = np.ones(len(table), dtype=np.uint64)
+        expected = table.amounts
+        actual = reconcile_tokens(use_network, table, mint_key, args.workers)
+        # an address listed more than once is one row here, so it is short when only some of its lines landed.
+        # balances are all that can be read, tokens the recipient moved on count as never received
+        status = np.where(actual >= expected, "complete", np.where(actual > 0, "short", "missing"))
+        status = np.where((lines > 1) & (status == "complete"), "duplicated", status)
+        if args.kind == "fungible":
+            retry = [str(address) for (address, _), s in zip(table, status) if s in ("missing", "short")]
+        else:
+            # only the shortfall is sent again. get_address_list triples the amounts in the file, so they are written
+            # back the way they were read, rounded up so one retry is enough. (x + 2) // 3 since the columns are
+            # unsigned and can't be negated
+            shortfall = (np.where(actual < expected, expected - actual, 0) + 2) // 3
+            retry = [f"{table.key(i)}\t{shortfall[i]}" for i in range(len(table))
+                     if status[i] in ("missing", "short") and shortfall[i] > 0]
+
+    report_path = args.report or f"{args.airdrop_file}.reconcile.csv"
+    with open(report_path, "w") as f:
+        f.write("address,expected,actual,lines,status\n")
+        for i in range(len(table)):
+            f.write(f"{table.key(i)},{expected[i]},{actual[i]},{lines[i]},{status[i]}\n")
+
+    retry_path = args.retry or f"{args.airdrop_file}.retry"
+    with open(retry_path, "w") as f:
+        f.write("".join(line + "\n" for line in retry))
+
+    for name in ("complete", "short", "missing", "duplicated"):
+        print(f"{name + ':':<12} {int(np.count_nonzero(status == name))}")
+    print(f"report written to {report_path}, {len(retry)} recipients to retry written to {retry_path}")
+    if args.kind == "amounts" and np.count_nonzero(status == "short"):
+        # the default path of wdao_token_drop.py always creates the associated token account first, which fails for
+        # short recipients since theirs already exists. the sharded path only sends the transfer to existing accounts
+        print(f"short recipients already have a token account, send {retry_path} with "
+              f"wdao_token_drop.py --shard-payers <payment_key> rather than the default path")
@@ -0,0 +1,198 @@
+import os
+import json
+import struct
+import hashlib
+
+from solana.publickey import PublicKey
+from solana.keypair import Keypair
+
+from bulk_read import fetch_accounts, grouped
+from instruction_builder import TOKEN_PROGRAM_ID
+from pipeline import PACKET_DATA_SIZE, transaction_size
+
+# rows are pre-read from the cluster this many at a time while streaming recipients
+READ_AHEAD = 1000
+# token account layout: mint, owner, then the u64 amount
+TOKEN_ACCOUNT_AMOUNT_OFFSET = 64
+# Sender only waits for confirmed, so setup reads balances back at the same commitment
+SETUP_COMMITMENT = "confirmed"
+
+
+class Shard:
+    # a source token account and the keypair that owns it and pays for the transfers out of it
+
+    def __init__(self, owner, token_account):
+        self.owner = owner
+        self.token_account = PublicKey(token_account)
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def assign_shards(recipients, shard_count):
+    # round robin over the position in the airdrop file, so the assignment only depends on the file itself
+    return ((i % shard_count, recipient) for i, recipient in enumerate(recipients))
+
+
+def shard_totals(recipients, shard_count):
+    totals = [0] * shard_count
+    counts = [0] * shard_count
+    for shard, (_, amount) in assign_shards(recipients, shard_count):
+        totals[shard] += amount
+        counts[shard] += 1
+    return totals, counts
+
+
+def get_transfer_entries(api_endpoint, mint_key, assigned, shards, build_xfer, workers=8):
+    # assigned are (shard, (dest, amount)). build_xfer(dest, amount, shard) returns the create associated token
+    # account + transfer transaction. a packed transaction fails as a whole if one of its token accounts already
+    # exists, so existing ones are looked up in bulk and only the transfer is sent for them
+    from spl.token.instructions import get_associated_token_address
+
+    for group in grouped(assigned, READ_AHEAD):
+        existing = fetch_accounts(api_endpoint, [get_associated_token_address(dest, mint_key)
+                                                 for _, (dest, _) in group], workers)
+        for (shard, (dest, amount)), account_data in zip(group, existing):
+            txn = build_xfer(dest, amount, shards[shard])
+            instructions = txn.instructions if account_data is None else txn.instructions[1:]
+            yield str(dest), instructions, [shards[shard].owner], shard
+
+
+def pack_sharded(entries, max_size=PACKET_DATA_SIZE, max_entries=None, lookup_tables=None):
+    # like pipeline.pack_instructions, but entries carry their shard and a transaction only ever holds one shard.
+    # with round robin assignment the shards fill up together, so consecutive batches write to different accounts
+    open_batches = {}
+    for key, entry_instructions, signers, shard in entries:
+        keys, instructions, _ = open_batches.get(shard, ([], [], signers))
+        candidate = instructions + list(entry_instructions)
+        if instructions and (len(keys) == max_entries or
+                             transaction_size(candidate, signers[0].public_key, lookup_tables) > max_size):
+            yield keys, instructions, signers, {"shard": shard}
+            keys, candidate = [], list(entry_instructions)
+        if transaction_size(candidate, signers[0].public_key, lookup_tables) > max_size:
+            raise ValueError(f"instructions for {key} do not fit in a single transaction")
+        open_batches[shard] = (keys + [key], candidate, signers)
+    for shard, (keys, instructions, signers) in open_batches.items():
+        yield keys, instructions, signers, {"shard": shard}
+
+
+def _send(sender, instructions, signers, what):
+    signature, error = sender.send(instructions, signers)
+    if error is not None:
+        raise RuntimeError(f"failed to {what}: {error}")
+    print(f"{signature} {what}")
+
+
+def _token_balance(api_endpoint, token_account):
+    data = fetch_accounts(api_endpoint, [token_account], commitment=SETUP_COMMITMENT)[0]
+    return struct.unpack_from("<Q", data, TOKEN_ACCOUNT_AMOUNT_OFFSET)[0] if data is not None else 0
+
+
+def _top_up(state_path, state, entry, field, balance, amount):
+    # the balance to reach is stored before anything is sent, so a rerun after a funding transaction landed
+    # without its step being recorded only sends what is still missing instead of funding the shard twice
+    if field not in entry:
+        entry[field] = balance + amount
+        _store_state(state_path, state)
+    return max(entry[field] - balance, 0)
+
+
+def _store_state(state_path, state):
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(json.dumps(state, indent=2))
+    os.replace(tmp_path, state_path)
+
+
+def setup_shards(sender, payer, mint_key, source_ta, owners, totals, counts, airdrop_file, state_path,
+                 min_balance_token_account, lamports_per_item):
+    # splits the tokens for the drop across len(totals) source token accounts. shard i is owned by
+    # owners[i % len(owners)], using that owner's associated token account the first time and a fresh token account
+    # after that. owners other than payer are also sent enough SOL for fees and the recipients' token account rent.
+    # every finished step is written to state_path so an interrupted setup picks up where it stopped, and funding
+    # tops balances up to a target recorded before sending so it is never applied twice
+    from solana.system_program import CreateAccountParams, TransferParams as SystemTransferParams, create_account, \
+        transfer as system_transfer
+    from spl.token.instructions import InitializeAccountParams, TransferParams, initialize_account, transfer, \
+        create_associated_token_account, get_associated_token_address
+
+    shard_count = len(totals)
+    # every transaction write locks its fee payer, the shard owner, so shards sharing an owner still contend
+    distinct_owners = len({bytes(o.public_key) for o in owners})
+    if distinct_owners < shard_count:
+        print(f"WARNING: {shard_count} shards but only {distinct_owners} distinct fee payers, transactions sharing a "
+              f"fee payer still contend for its write lock. pass one --shard-payers keypair per shard to avoid it")
+    digest = file_digest(airdrop_file)
+    state = None
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            state = json.loads(f.read())
+        if state["airdrop_sha256"] != digest or len(state["shards"]) != shard_count:
+            raise ValueError(f"{state_path} was set up for a different airdrop file or shard count")
+
+    if state is None:
+        shards = []
+        used_owners = set()
+        for i in range(shard_count):
+            owner = owners[i % len(owners)]
+            entry = {"owner": str(owner.public_key), "created": False, "funded": False, "funded_sol": False}
+            if str(owner.public_key) in used_owners:
+                entry["token_account_secret"] = list(Keypair.generate().secret_key)
+                entry["token_account"] = str(Keypair.from_secret_key(bytes(entry["token_account_secret"])).public_key)
+            else:
+                entry["token_account"] = str(get_associated_token_address(owner.public_key, mint_key))
+            used_owners.add(str(owner.public_key))
+            shards.append(entry)
+        state = {"airdrop_sha256": digest, "mint": str(mint_key), "assignment": "round_robin", "shards": shards}
+        _store_state(state_path, state)
+
+    owners_by_key = {str(o.public_key): o for o in owners}
+    existing = fetch_accounts(sender.api_endpoint, [PublicKey(s["token_account"]) for s in state["shards"]],
+                              commitment=SETUP_COMMITMENT)
+    for i, (entry, account_data) in enumerate(zip(state["shards"], existing)):
+        owner = owners_by_key[entry["owner"]]
+        token_account = PublicKey(entry["token_account"])
+        if not entry["created"] and account_data is None:
+            if "token_account_secret" in entry:
+                account = Keypair.from_secret_key(bytes(entry["token_account_secret"]))
+                _send(sender, [
+                    create_account(CreateAccountParams(from_pubkey=payer.public_key, new_account_pubkey=token_account,
+                                                       lamports=min_balance_token_account, space=165,
+                                                       program_id=TOKEN_PROGRAM_ID)),
+                    initialize_account(InitializeAccountParams(program_id=TOKEN_PROGRAM_ID, account=token_account,
+                                                               mint=mint_key, owner=owner.public_key)),
+                ], [payer, account], f"create shard {i} token account")
+            else:
+                _send(sender, [create_associated_token_account(payer.public_key, owner.public_key, mint_key)],
+                      [payer], f"create shard {i} token account")
+        entry["created"] = True
+        # the token account keypair is only needed to create it
+        entry.pop("token_account_secret", None)
+        _store_state(state_path, state)
+
+        if not entry["funded"] and token_account != source_ta:
+            amount = _top_up(state_path, state, entry, "token_target",
+                             _token_balance(sender.api_endpoint, token_account), totals[i])
+            if amount:
+                _send(sender, [transfer(TransferParams(program_id=TOKEN_PROGRAM_ID, source=source_ta,
+                                                       dest=token_account, owner=payer.public_key, amount=amount))],
+                      [payer], f"fund shard {i} with {amount} tokens")
+        entry["funded"] = True
+        _store_state(state_path, state)
+
+        if not entry["funded_sol"] and owner.public_key != payer.public_key:
+            balance = sender.client().get_balance(owner.public_key, commitment=SETUP_COMMITMENT)["result"]["value"]
+            lamports = _top_up(state_path, state, entry, "sol_target", balance, counts[i] * lamports_per_item)
+            if lamports:
+                _send(sender, [system_transfer(SystemTransferParams(from_pubkey=payer.public_key,
+                                                                    to_pubkey=owner.public_key, lamports=lamports))],
+                      [payer], f"fund shard {i} owner with {lamports} lamports")
+        entry["funded_sol"] = True
+        _store_state(state_path, state)
+
+    return [Shard(owners_by_key[s["owner"]], s["token_account"]) for s in state["shards"]]
@@ -0,0 +1,104 @@
+import json
+import argparse
+
+from solana.publickey import PublicKey
+from solana.keypair import Keypair
+
+from bulk_read import fetch_accounts, grouped
+from instruction_builder import get_metadata_account, verify_collection_instruction, unverify_collection_instruction
+from metadata import parse_metadata_account
+from pipeline import Journal, Sender, pack_instructions, pending_entries, run_pipeline
+
+TESTNET = "https://api.testnet.solana.com"
+MAINNET = "https://ssc-dao.genesysgo.net/"
+DEVNET = "https://api.devnet.solana.com"
+
+USENET = TESTNET
+
+# rows are pre-read from the cluster this many at a time while streaming the mints file
+READ_AHEAD = 1000
+# verification is compute bound well before a transaction fills up
+VERIFY_PER_TX = 8
+
+
+def get_keypair(keypath):
+    with open(keypath) as f:
+        kpb = json.loads(f.read())
+    return Keypair.from_secret_key(secret_key=bytes(kpb))
+
+
+def get_mint_list(mints_file):
+    with open(mints_file) as f:
+        for line in f:
+            if len(line.strip()) > 1:
+                yield line.strip()
+
+
+def get_collection_entries(api_endpoint, mints, collection_mint, authority, unverify=False, delegated=False, workers=8):
+    # skips mints whose collection already has the wanted verified flag, and mints that point at another collection
+    for group in grouped(mints, READ_AHEAD):
+        metadata_accounts = fetch_accounts(api_endpoint, [get_metadata_account(mint) for mint in group], workers)
+        for mint, account_data in zip(group, metadata_accounts):
+            if account_data is None:
+                print(f"SKIPPED {mint}: no metadata account")
+                continue
+            collection = parse_metadata_account(account_data).collection
+            if collection is None or bytes(collection.key.pub_key) != bytes(collection_mint):
+                print(f"SKIPPED {mint}: not part of collection {collection_mint}")
+                continue
+            if collection.verified != unverify:
+                continue
+            if unverify:
+                ix = unverify_collection_instruction(PublicKey(mint), authority.public_key, collection_mint, delegated)
+            else:
+                ix = verify_collection_instruction(PublicKey(mint), authority.public_key, authority.public_key,
+                                                   collection_mint, delegated)
+            yield mint, [ix], [authority]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='bulk verify or unverify the collection of minted items')
+    parser.add_argument('--usenet', action="store", choices=["devnet", "testnet", "mainnet"],
+                        help='cluster to send transactions to')
+    parser.add_argument('--customnet', action="store",
+                        help='custom rpc endpoint to hit')
+    parser.add_argument('--unverify', action="store_true",
+                        help='unverify instead of verify')
+    parser.add_argument('--delegated', action="store_true",
+                        help='payment_key is a collection authority approved through ApproveCollectionAuthority '
+                             'rather than the collection update authority')
+    parser.add_argument('--per-tx', action="store", type=int, default=VERIFY_PER_TX,
+                        help='max instructions packed per transaction')
+    parser.add_argument('--workers', action="store", type=int, default=8,
+                        help='number of transactions in flight at once')
+    parser.add_argument('--journal', action="store",
+                        help='file recording mints that already landed. defaults to <mints_file>.<verify|unverify>.journal')
+
+    parser.add_argument('payment_key', action="store", help='path to the keypair used for payments and signing as the '
+                                                            'collection authority')
+    parser.add_argument('collection_mint', action="store", help='mint of the collection nft')
+    parser.add_argument('mints_file', action="store", help='file containing one item mint per line')
+
+    args = parser.parse_args()
+    use_network = USENET
+
+    if args.usenet == "testnet":
+        use_network = TESTNET
+    elif args.usenet == "mainnet":
+        use_network = MAINNET
+
+    if args.customnet:
+        use_network = args.customnet
+
+    source_account = get_keypair(args.payment_key)
+    collection_mint = PublicKey(args.collection_mint)
+    action = "unverify" if args.unverify else "verify"
+    journal = Journal(args.journal or f"{args.mints_file}.{action}.journal")
+
+    mints = pending_entries(get_mint_list(args.mints_file), journal, key=lambda mint: mint)
+    entries = get_collection_entries(use_network, mints, collection_mint, source_account, args.unverify,
+                                     args.delegated, args.workers)
+    batches = pack_instructions(entries, source_account.public_key, max_entries=args.per_tx)
+    sent, failed = run_pipeline(Sender(use_network), batches, journal, args.workers)
+    journal.close()
+    print(f"{sent} transactions landed, {failed} failed. {len(journal.done)} mints done in total")
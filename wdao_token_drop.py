@@ -4,17 +4,8 @@ import argparse
 
 from solana.publickey import PublicKey
 from solana.keypair import Keypair
-from solana.rpc.api import Client
-from solana.rpc.types import TxOpts
-from solana.transaction import Transaction
 
-
-from spl.token.core import _TokenCore
-from spl.token.client import Token
-from spl.token.instructions import get_associated_token_address, transfer, TransferParams
-
-from instruction_builder import mint_new_edition_from_master_edition_instruction, create_metadata_instruction, update_metadata_instruction
-from metadata import get_create_metadata_instruction, get_update_metadata_instruction
+from cluster_cache import get_rent_exempt_minimums
 
 TESTNET = "https://api.testnet.solana.com"
 MAINNET = "https://ssc-dao.genesysgo.net/"
@@ -23,11 +14,12 @@ DEVNET = "https://api.devnet.solana.com"
 USENET = TESTNET
 
 def get_address_list(address_file):
+    from recipients import RecipientTable
+
     with open(address_file) as f:
-        lines = filter(lambda x: len(x) > 1, f.read().split("\n"))
-    addr_amounts = [l.split("\t") for l in lines]
-    addr_amounts = [(PublicKey(x[0]),int(x[1])*3) for x in addr_amounts]
-    return addr_amounts
+        lines = filter(lambda x: len(x) > 1, (l.rstrip("\n") for l in f))
+        addr_amounts = (l.split("\t") for l in lines)
+        return RecipientTable.from_rows(((x[0], 0, int(x[1])*3) for x in addr_amounts), with_amounts=True)
 
 def get_keypair(keypath):
     with open(keypath) as f:
@@ -57,6 +49,9 @@ def await_confirmation(client, signatures, max_timeout=60, target=20, finalized=
 
 def execute(api_endpoint, tx, signers, skip_confirmation=True, max_timeout=60, target=20,
             finalized=True):
+    from solana.rpc.api import Client
+    from solana.rpc.types import TxOpts
+
     client = Client(api_endpoint)
     try:
         result = client.send_transaction(tx, *signers, opts=TxOpts(skip_preflight=True))
@@ -70,6 +65,9 @@ def execute(api_endpoint, tx, signers, skip_confirmation=True, max_timeout=60, t
         print(traceback.format_exc())
 
 def get_instruction_batch_xfer(conn, mint_key, dest, source_ta, payer, amount):
+    from spl.token.client import Token
+    from spl.token.instructions import transfer, TransferParams
+
     token = Token(conn, mint_key, PublicKey("TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA"),payer)
     assoc_addr, txn, _,_ = token._create_associated_token_account_args(dest, False)
     params = TransferParams(
@@ -93,6 +91,15 @@ if __name__ == "__main__":
     parser.add_argument('payment_key', action="store", help='path to the keypair used for payments')
     parser.add_argument('mint_key', action="store", help='master edition must already be created and owned by payment_key')
     parser.add_argument('airdrop_file', action="store", help='file containing addresses')
+    parser.add_argument('--shards', action="store", type=int, default=1,
+                        help='split the tokens across this many source token accounts. the fee payer is write '
+                             'locked too, so transfers only stop contending for write locks with as many distinct '
+                             '--shard-payers as shards')
+    parser.add_argument('--shard-payers', action="store",
+                        help='comma separated keypair paths owning the shards and paying their fees, '
+                             'round robin. defaults to payment_key')
+    parser.add_argument('--workers', action="store", type=int, default=8,
+                        help='number of transactions in flight at once with --shards')
 
     args = parser.parse_args()
     use_network = USENET
@@ -105,6 +112,9 @@ if __name__ == "__main__":
     if args.customnet:
         use_network = args.customnet
 
+    from solana.rpc.api import Client
+    from spl.token.instructions import get_associated_token_address
+
     http_client = Client(use_network)
 
     source_account = get_keypair(args.payment_key)
@@ -114,10 +124,35 @@ if __name__ == "__main__":
     addresses = get_address_list(airdrop_file)
     source_ta = get_associated_token_address(source_account.public_key, mint_key)
 
-    for (dest_address, amount) in addresses:
-        txn = get_instruction_batch_xfer(http_client, mint_key, dest_address, source_ta, source_account, amount)
-        signers = [source_account]
-        print(execute(use_network, txn, signers, True))
+    if args.shards > 1 or args.shard_payers:
+        from pipeline import Journal, Sender, pending_entries, run_pipeline
+        from sharding import assign_shards, get_transfer_entries, pack_sharded, setup_shards, shard_totals
+
+        # an address listed more than once gets the sum of its amounts in one transfer
+        recipients = addresses.merge_duplicates()
+
+        sender = Sender(use_network)
+        owners = [get_keypair(p) for p in args.shard_payers.split(",")] if args.shard_payers else [source_account]
+        totals, counts = shard_totals(recipients, args.shards)
+        _, min_balance_token_account = get_rent_exempt_minimums(use_network)
+        shards = setup_shards(sender, source_account, mint_key, source_ta, owners, totals, counts, airdrop_file,
+                              f"{airdrop_file}.shards.json", min_balance_token_account, min_balance_token_account + 5000)
+        journal = Journal(f"{airdrop_file}.journal")
+
+        def build_xfer(dest, amount, shard):
+            return get_instruction_batch_xfer(http_client, mint_key, dest, shard.token_account, shard.owner, amount)
+
+        # shards are assigned over the whole file before skipping what already landed, so a rerun keeps them
+        pending = pending_entries(assign_shards(recipients, len(shards)), journal, key=lambda a: str(a[1][0]))
+        entries = get_transfer_entries(use_network, mint_key, pending, shards, build_xfer, args.workers)
+        sent, failed = run_pipeline(sender, pack_sharded(entries), journal, args.workers)
+        journal.close()
+        print(f"{sent} transactions landed, {failed} failed. {len(journal.done)} addresses done in total")
+    else:
+        for (dest_address, amount) in addresses:
+            txn = get_instruction_batch_xfer(http_client, mint_key, dest_address, source_ta, source_account, amount)
+            signers = [source_account]
+            print(execute(use_network, txn, signers, True))
 
 
 